@@ -1,10 +1,20 @@
 
+from django.core.cache import cache
 from django.urls import NoReverseMatch, reverse
 from simple_sso.settings import settings
 from simple_sso.sso_server.models import Token
 from webservices.sync import SyncConsumer
 
 
+def clear_cached_consumer(sender, instance, **kwargs):
+    """
+    A signal receiver which drops a consumer's cached key pair when the
+    consumer is saved or deleted.
+    """
+    from simple_sso.sso_server.server import consumer_cache_key
+    cache.delete(consumer_cache_key(instance.public_key))
+
+
 def logout_token(sender, request, **kwargs):
     """
     A signal receiver which removes a token when its users logs out.
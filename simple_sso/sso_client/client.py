@@ -1,5 +1,5 @@
 from copy import copy
-from urllib.parse import urlparse, urlunparse, urljoin, urlencode
+from urllib.parse import urlparse, urlunparse, urljoin, urlencode, urlsplit, urlunsplit
 
 from django.urls import re_path
 from django.contrib.auth import login
@@ -8,9 +8,10 @@ from django.contrib.auth.models import Group, User
 from django.http import HttpResponseRedirect
 from django.urls import NoReverseMatch, reverse
 from django.views.generic import View
-from itsdangerous import URLSafeTimedSerializer
 from webservices.sync import SyncConsumer
 
+from simple_sso import signing
+
 
 class LoginView(View):
     client = None
@@ -21,7 +22,7 @@ class LoginView(View):
         query = urlencode([('next', next)])
         netloc = request.get_host()
         path = reverse('simple-sso-authenticate')
-        redirect_to = urlunparse((scheme, netloc, path, '', query, ''))
+        redirect_to = urlunsplit((scheme, netloc, path, query, ''))
         request_token = self.client.get_request_token(redirect_to)
         try:
             authorize_url = reverse('simple-sso-authorize')
@@ -39,7 +40,7 @@ class LoginView(View):
         next = self.request.GET.get('next', None)
         if not next:
             return '/'
-        netloc = urlparse(next)[1]
+        netloc = urlsplit(next)[1]
         # Heavier security check -- don't allow redirection to a different
         # host.
         # Taken from django.contrib.auth.views.login
@@ -53,7 +54,7 @@ class AuthenticateView(LoginView):
 
     def get(self, request):
         raw_access_token = request.GET['access_token']
-        access_token = URLSafeTimedSerializer(self.client.private_key).loads(raw_access_token)
+        access_token = signing.loads(self.client.private_key, raw_access_token)
         request.session['sso_access_token'] = access_token
         user = self.client.get_user(access_token)
         user.backend = self.client.backend
@@ -1,10 +1,29 @@
 from django.apps import AppConfig
 from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
 
 
 class SimpleSSOServer(AppConfig):
     name = 'simple_sso.sso_server'
 
     def ready(self):
-        from simple_sso.signals import logout_token
+        from simple_sso.settings import settings
+        from simple_sso.signals import clear_cached_consumer, logout_token
+        from simple_sso.sso_server.models import Consumer
         user_logged_out.connect(logout_token, dispatch_uid='logout_token')
+        if settings.SSO_REGISTER_ADMIN:
+            self.register_admin()
+        post_save.connect(
+            clear_cached_consumer, sender=Consumer,
+            dispatch_uid='clear_cached_consumer_save')
+        post_delete.connect(
+            clear_cached_consumer, sender=Consumer,
+            dispatch_uid='clear_cached_consumer_delete')
+
+    def register_admin(self):
+        from django.contrib import admin
+
+        from simple_sso.sso_server.models import Consumer, Token
+        from simple_sso.sso_server.server import ConsumerAdmin, TokenAdmin
+        admin.site.register(Consumer, ConsumerAdmin)
+        admin.site.register(Token, TokenAdmin)
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.17 on 2026-08-29 17:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def populate_token_columns(apps, schema_editor):
+    from simple_sso.sso_server.models import hash_access_token
+
+    Token = apps.get_model('sso_server', 'Token')
+    fields = ['access_token_hash', 'consumer_private_key']
+    batch = []
+    for token in Token.objects.select_related('consumer').iterator():
+        token.access_token_hash = hash_access_token(token.access_token)
+        token.consumer_private_key = token.consumer.private_key
+        batch.append(token)
+        if len(batch) >= BATCH_SIZE:
+            Token.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        Token.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sessions', '0001_initial'),
+        ('sso_server', '0004_token_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='token',
+            name='access_token_hash',
+            field=models.CharField(default='', max_length=128),
+        ),
+        migrations.AddField(
+            model_name='token',
+            name='consumer_private_key',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='token',
+            index=models.Index(fields=['access_token_hash', 'consumer'], name='sso_server__access__1a2614_idx'),
+        ),
+        migrations.RunPython(
+            populate_token_columns, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,6 @@
+import datetime
+import hmac
+
 from django.contrib.sessions.models import Session
 from django.db import models
 from django.utils import timezone
@@ -7,6 +10,18 @@ from simple_sso.settings import settings
 from ..utils import gen_secret_key
 
 
+def hash_access_token(access_token):
+    """
+    Returns a keyed hex digest of an access token, used for indexed token
+    lookups that are not timing-observable through the database. Hex rather
+    than raw bytes so the column indexes correctly on every backend (MySQL
+    cannot index blobs without a key length).
+    """
+    return hmac.new(
+        settings.SECRET_KEY.encode(), access_token.encode(), 'blake2b'
+    ).hexdigest()
+
+
 @deconstructible
 class SecretKeyGenerator:
     """
@@ -67,6 +82,10 @@ class Token(models.Model):
         unique=True, max_length=64,
         default=TokenSecretKeyGenerator('access_token')
     )
+    access_token_hash = models.CharField(max_length=128, default='')
+    # Copied from the consumer at creation so the hot paths can sign and
+    # verify without joining the consumer table.
+    consumer_private_key = models.CharField(max_length=64, default='')
     timestamp = models.DateTimeField(default=timezone.now)
     redirect_to = models.CharField(max_length=1023)
     user = models.ForeignKey(
@@ -80,6 +99,35 @@ class Token(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['access_token_hash', 'consumer']),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.access_token_hash = hash_access_token(self.access_token)
+        super().save(*args, **kwargs)
+
     def refresh(self):
         self.timestamp = timezone.now()
-        self.save()
+        Token.objects.filter(pk=self.pk).update(timestamp=self.timestamp)
+
+    @classmethod
+    def cleanup_expired(cls, timeout=None, chunk_size=2000):
+        """
+        Deletes tokens older than `timeout` (defaults to the verify timeout,
+        the longest a token stays usable) in primary key batches, so large
+        backlogs are streamed instead of loaded into memory at once. Returns
+        the number of tokens deleted.
+        """
+        if timeout is None:
+            timeout = datetime.timedelta(
+                seconds=settings.SSO_TOKEN_VERIFY_TIMEOUT)
+        expired = cls.objects.filter(
+            timestamp__lt=timezone.now() - timeout).values_list('pk', flat=True)
+        deleted = 0
+        while True:
+            batch = list(expired[:chunk_size])
+            if not batch:
+                return deleted
+            deleted += cls.objects.filter(pk__in=batch).delete()[0]
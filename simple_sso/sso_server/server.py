@@ -1,21 +1,68 @@
 import datetime
-from urllib.parse import urlparse, urlencode, urlunparse
+import functools
+from collections import namedtuple
+from urllib.parse import quote, urlencode, urlsplit, urlunsplit
 
-from django.contrib import admin
 from django.contrib.admin.options import ModelAdmin
-from django.contrib.sessions.models import Session
-from django.http import HttpResponse, HttpResponseForbidden, HttpResponseBadRequest, HttpResponseRedirect, QueryDict
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseBadRequest, HttpResponseRedirect
 from django.urls import re_path
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_POST
 from django.views.generic.base import View
-from itsdangerous import URLSafeTimedSerializer
+from simple_sso import signing
 from simple_sso.settings import settings
-from simple_sso.sso_server.models import Token, Consumer
+from simple_sso.sso_server.models import Token, Consumer, hash_access_token
 from webservices.models import Provider
 from webservices.sync import provider_for_django
 
 
+CONSUMER_CACHE_TIMEOUT = 300
+
+ConsumerInfo = namedtuple('ConsumerInfo', ['pk', 'private_key'])
+
+
+def consumer_cache_key(public_key):
+    return 'sso:consumer:%s' % public_key
+
+
+@functools.lru_cache(maxsize=None)
+def _timeout(seconds):
+    # One timedelta per distinct setting value instead of one per request.
+    return datetime.timedelta(seconds=seconds)
+
+
+def _active_tokens(timeout):
+    """
+    Returns a queryset of tokens that have not outlived `timeout`, so the
+    expiry check happens in the WHERE clause of the lookup itself. Expired
+    rows are left behind for bulk cleanup.
+    """
+    return Token.objects.filter(timestamp__gt=timezone.now() - timeout)
+
+
+def get_consumer_info(public_key):
+    """
+    Returns the (pk, private_key) pair for the consumer identified by
+    `public_key`, or None if no such consumer exists. The pair is cached to
+    avoid hitting the database on every SSO request.
+    """
+    cache_key = consumer_cache_key(public_key)
+    info = cache.get(cache_key)
+    if info is None:
+        try:
+            consumer = Consumer.objects.only('pk', 'private_key').get(public_key=public_key)
+        except Consumer.DoesNotExist:
+            return None
+        info = ConsumerInfo(pk=consumer.pk, private_key=consumer.private_key)
+        cache.set(cache_key, info, timeout=CONSUMER_CACHE_TIMEOUT)
+    return info
+
+
 class ThrowableHttpResponse(Exception):
     def __init__(self, response: HttpResponse):
         self.response = response
@@ -31,9 +78,8 @@ class BaseProvider(Provider):
         self.server = server
 
     def get_private_key(self, public_key):
-        try:
-            self.consumer = Consumer.objects.get(public_key=public_key)
-        except Consumer.DoesNotExist:
+        self.consumer = get_consumer_info(public_key)
+        if self.consumer is None:
             return None
         return self.consumer.private_key
 
@@ -47,7 +93,10 @@ class BaseProvider(Provider):
 class RequestTokenProvider(BaseProvider):
     def provide(self, data):
         redirect_to = data['redirect_to']
-        token = Token.objects.create(consumer=self.consumer, redirect_to=redirect_to)
+        token = Token.objects.create(
+            consumer_id=self.consumer.pk,
+            consumer_private_key=self.consumer.private_key,
+            redirect_to=redirect_to)
         return {'request_token': token.request_token}
 
 
@@ -63,16 +112,17 @@ class AuthorizeView(View):
     """
     server = None
 
+    @method_decorator(never_cache)
     def get(self, request):
         request_token = request.GET.get('token', None)
         if not request_token:
             return self.missing_token_argument()
-        try:
-            self.token = Token.objects.select_related('consumer').get(request_token=request_token)
-        except Token.DoesNotExist:
+        self.token = _active_tokens(self.server.token_timeout).select_related(
+            'consumer').filter(request_token=request_token).first()
+        if self.token is None:
+            if Token.objects.filter(request_token=request_token).exists():
+                return self.token_timeout()
             return self.token_not_found()
-        if not self.check_token_timeout():
-            return self.token_timeout()
         self.token.refresh()
         if request.user.is_authenticated:
             return self.handle_authenticated_user()
@@ -88,17 +138,6 @@ class AuthorizeView(View):
     def token_timeout(self):
         return HttpResponseForbidden('Token timed out')
 
-    def check_token_timeout(self, timeout=None):
-        if timeout is None:
-            timeout = self.server.token_timeout
-
-        delta = timezone.now() - self.token.timestamp
-        if delta > timeout:
-            self.token.delete()
-            return False
-        else:
-            return True
-
     def handle_authenticated_user(self):
         if self.server.has_access(self.request.user, self.token.consumer):
             return self.success()
@@ -106,8 +145,11 @@ class AuthorizeView(View):
             return self.access_denied()
 
     def handle_unauthenticated_user(self):
-        next = '%s?%s' % (self.request.path, urlencode([('token', self.token.request_token)]))
-        url = '%s?%s' % (reverse(self.server.auth_view_name), urlencode([('next', next)]))
+        # The token is quoted because SIMPLE_SSO_KEYGENERATOR may emit
+        # reserved characters; for the default alphanumeric tokens quoting
+        # is a no-op and still cheaper than urlencoding each pair.
+        next = '%s?token=%s' % (self.request.path, quote(self.token.request_token, safe=''))
+        url = '%s?next=%s' % (reverse(self.server.auth_view_name), quote(next, safe=''))
         return HttpResponseRedirect(url)
 
     def access_denied(self):
@@ -115,26 +157,33 @@ class AuthorizeView(View):
 
     def success(self):
         self.token.user = self.request.user
-        self.token.session = Session.objects.get(
-            pk=self.request.session.session_key)
-        self.token.save()
-        serializer = URLSafeTimedSerializer(self.token.consumer.private_key)
-        parse_result = urlparse(self.token.redirect_to)
-        query_dict = QueryDict(parse_result.query, mutable=True)
-        query_dict['access_token'] = serializer.dumps(self.token.access_token)
-        url = urlunparse((parse_result.scheme, parse_result.netloc, parse_result.path, '', query_dict.urlencode(), ''))
+        self.token.session_id = self.request.session.session_key
+        self.token.save(update_fields=['user', 'session'])
+        parts = urlsplit(self.token.redirect_to)
+        extra = urlencode({'access_token': signing.dumps(
+            self.token.consumer_private_key, self.token.access_token)})
+        query = '%s&%s' % (parts.query, extra) if parts.query else extra
+        url = urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))
         return HttpResponseRedirect(url)
 
 
 class VerificationProvider(BaseProvider, AuthorizeView):
-    def provide(self, data):
-        token = data['access_token']
-        try:
-            self.token = Token.objects.select_related('user').get(access_token=token, consumer=self.consumer)
-        except Token.DoesNotExist:
+    def _get_token(self, access_token, *rels):
+        """
+        Fetches the active token for `access_token` with the given relations
+        joined, raising the appropriate error response on a miss.
+        """
+        digest = hash_access_token(access_token)
+        token = _active_tokens(self.server.token_verify_timeout).select_related(
+            *rels).filter(access_token_hash=digest, consumer_id=self.consumer.pk).first()
+        if token is None:
+            if Token.objects.filter(access_token_hash=digest, consumer_id=self.consumer.pk).exists():
+                raise ThrowableHttpResponse(self.token_timeout())
             raise ThrowableHttpResponse(self.token_not_found())
-        if not self.check_token_timeout(self.server.token_verify_timeout):
-            raise ThrowableHttpResponse(self.token_timeout())
+        return token
+
+    def provide(self, data):
+        self.token = self._get_token(data['access_token'], 'user')
         if not self.token.user:
             raise ThrowableHttpResponse(self.token_not_bound())
         extra_data = data.get('extra_data', None)
@@ -147,14 +196,7 @@ class VerificationProvider(BaseProvider, AuthorizeView):
 
 class LogoutProvider(VerificationProvider):
     def provide(self, data):
-        token = data['access_token']
-        try:
-            self.token = Token.objects.select_related('session').get(
-                access_token=token, consumer=self.consumer)
-        except Token.DoesNotExist:
-            raise ThrowableHttpResponse(self.token_not_found())
-        if not self.check_token_timeout(self.server.token_verify_timeout):
-            raise ThrowableHttpResponse(self.token_timeout())
+        self.token = self._get_token(data['access_token'], 'session')
         if not self.token.session:
             raise ThrowableHttpResponse(self.token_not_bound())
 
@@ -182,21 +224,35 @@ class Server:
     authorize_view = AuthorizeView
     verification_provider = VerificationProvider
     logout_provider = LogoutProvider
-    token_timeout = datetime.timedelta(seconds=settings.SSO_TOKEN_TIMEOUT)
-    token_verify_timeout = datetime.timedelta(
-        seconds=settings.SSO_TOKEN_VERIFY_TIMEOUT)
-    consumer_admin = ConsumerAdmin
-    token_admin = TokenAdmin
+    _token_timeout = None
+    _token_verify_timeout = None
     auth_view_name = 'login'
 
     def __init__(self, **kwargs):
+        self._urls = None
         for key, value in kwargs.items():
             setattr(self, key, value)
-        self.register_admin()
 
-    def register_admin(self):
-        admin.site.register(Consumer, self.consumer_admin)
-        admin.site.register(Token, self.token_admin)
+    @property
+    def token_timeout(self):
+        # Read lazily so override_settings and runtime changes are picked up.
+        if self._token_timeout is not None:
+            return self._token_timeout
+        return _timeout(settings.SSO_TOKEN_TIMEOUT)
+
+    @token_timeout.setter
+    def token_timeout(self, value):
+        self._token_timeout = value
+
+    @property
+    def token_verify_timeout(self):
+        if self._token_verify_timeout is not None:
+            return self._token_verify_timeout
+        return _timeout(settings.SSO_TOKEN_VERIFY_TIMEOUT)
+
+    @token_verify_timeout.setter
+    def token_verify_timeout(self, value):
+        self._token_verify_timeout = value
 
     def has_access(self, user, consumer):
         return True
@@ -205,10 +261,6 @@ class Server:
         raise NotImplementedError()
 
     def get_user_data(self, user, consumer, extra_data=None):
-        groups = []
-        for group in user.groups.all():
-            groups.append(group.name)
-
         user_data = {
             'username': user.username,
             'email': user.email,
@@ -217,20 +269,30 @@ class Server:
             'is_staff': False,
             'is_superuser': False,
             'is_active': user.is_active,
-            'groups': groups,
+            'groups': list(user.groups.values_list('name', flat=True)),
         }
         if extra_data:
             user_data['extra_data'] = self.get_user_extra_data(
                 user, consumer, extra_data)
         return user_data
 
+    def get_provider_view(self, provider):
+        # Consumers always POST signed data; reject other methods early and
+        # keep token-bearing responses out of any intermediate caches.
+        return require_POST(never_cache(provider_for_django(provider)))
+
     def get_urls(self):
-        return [
-            re_path(r'^request-token/$', provider_for_django(self.request_token_provider(server=self)),
-                    name='simple-sso-request-token'),
-            re_path(r'^authorize/$', self.authorize_view.as_view(server=self), name='simple-sso-authorize'),
-            re_path(r'^verify/$', provider_for_django(
-                    self.verification_provider(server=self)), name='simple-sso-verify'),
-            re_path(r'^logout/$', provider_for_django(
-                    self.logout_provider(server=self)), name='simple-sso-logout'),
-        ]
+        if self._urls is None:
+            self._urls = [
+                re_path(r'^request-token/$', self.get_provider_view(self.request_token_provider(server=self)),
+                        name='simple-sso-request-token'),
+                # Mostly reads plus a single targeted write; keep it out of
+                # ATOMIC_REQUESTS so no transaction spans the whole request.
+                re_path(r'^authorize/$', transaction.non_atomic_requests(
+                        self.authorize_view.as_view(server=self)), name='simple-sso-authorize'),
+                re_path(r'^verify/$', self.get_provider_view(
+                        self.verification_provider(server=self)), name='simple-sso-verify'),
+                re_path(r'^logout/$', self.get_provider_view(
+                        self.logout_provider(server=self)), name='simple-sso-logout'),
+            ]
+        return self._urls
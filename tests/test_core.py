@@ -1,3 +1,4 @@
+import datetime
 from urllib.parse import urlparse
 
 from django.conf import settings
@@ -7,7 +8,9 @@ from django.contrib.auth.models import User
 from django.contrib.auth.models import Group
 from django.http import HttpResponseRedirect, HttpResponse
 from django.test.testcases import TestCase
+from django.utils import timezone
 from simple_sso.sso_server.models import Token, Consumer
+from simple_sso.sso_server.server import get_consumer_info
 from tests.urls import test_client
 from tests.utils.context_managers import (SettingsOverride,
                                           UserLoginContext)
@@ -147,6 +150,57 @@ class SimpleSSOTests(TestCase):
             for key in ['username', 'email', 'first_name', 'last_name']:
                 self.assertEqual(getattr(client_user, key), getattr(server_user, key))
 
+    def test_consumer_cache_hit(self):
+        consumer = Consumer.objects.create(name='cached')
+        info = get_consumer_info(consumer.public_key)
+        self.assertEqual(info.pk, consumer.pk)
+        self.assertEqual(info.private_key, consumer.private_key)
+        # the second lookup must be served from the cache
+        with self.assertNumQueries(0):
+            self.assertEqual(get_consumer_info(consumer.public_key), info)
+
+    def test_consumer_cache_invalidated_on_save(self):
+        consumer = Consumer.objects.create(name='cached')
+        get_consumer_info(consumer.public_key)
+        consumer.private_key = gen_secret_key(64)
+        consumer.save()
+        info = get_consumer_info(consumer.public_key)
+        self.assertEqual(info.private_key, consumer.private_key)
+
+    def test_consumer_cache_invalidated_on_delete(self):
+        consumer = Consumer.objects.create(name='cached')
+        get_consumer_info(consumer.public_key)
+        public_key = consumer.public_key
+        consumer.delete()
+        self.assertIsNone(get_consumer_info(public_key))
+
+    def test_unknown_consumer(self):
+        self.assertIsNone(get_consumer_info('no-such-key'))
+
+    def _expire(self, token, seconds):
+        Token.objects.filter(pk=token.pk).update(
+            timestamp=timezone.now() - datetime.timedelta(seconds=seconds))
+
+    def test_authorize_distinguishes_timed_out_from_missing(self):
+        consumer = self._get_consumer()
+        token = Token.objects.create(consumer=consumer, redirect_to='/')
+        self._expire(token, settings.SSO_TOKEN_TIMEOUT + 1)
+        response = self.client.get(
+            reverse('simple-sso-authorize'), {'token': token.request_token})
+        self.assertContains(response, 'Token timed out', status_code=403)
+        response = self.client.get(
+            reverse('simple-sso-authorize'), {'token': 'unknown'})
+        self.assertContains(response, 'Token not found', status_code=403)
+
+    def test_cleanup_expired_deletes_in_batches(self):
+        consumer = self._get_consumer()
+        for _ in range(5):
+            token = Token.objects.create(consumer=consumer, redirect_to='/')
+            self._expire(token, settings.SSO_TOKEN_VERIFY_TIMEOUT + 1)
+        fresh = Token.objects.create(consumer=consumer, redirect_to='/')
+        self.assertEqual(Token.cleanup_expired(chunk_size=2), 5)
+        self.assertEqual(list(Token.objects.all()), [fresh])
+
     def test_custom_keygen(self):
         # WARNING: The following test uses a key generator function that is
         # highly insecure and should never under any circumstances be used in
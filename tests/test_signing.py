@@ -0,0 +1,48 @@
+import time
+
+from django.test import SimpleTestCase
+from simple_sso import signing
+
+
+class SigningTests(SimpleTestCase):
+
+    def test_roundtrip(self):
+        signed = signing.dumps('private', 'some-access-token')
+        self.assertEqual(signing.loads('private', signed), 'some-access-token')
+
+    def test_roundtrip_with_long_key(self):
+        key = 'k' * 100
+        signed = signing.dumps(key, 'some-access-token')
+        self.assertEqual(signing.loads(key, signed), 'some-access-token')
+
+    def test_wrong_key(self):
+        signed = signing.dumps('private', 'some-access-token')
+        with self.assertRaises(signing.BadSignature):
+            signing.loads('other', signed)
+
+    def test_tampered_value(self):
+        signed = signing.dumps('private', 'some-access-token')
+        with self.assertRaises(signing.BadSignature):
+            signing.loads('private', 'x' + signed[1:])
+
+    def test_tampered_signature(self):
+        signed = signing.dumps('private', 'some-access-token')
+        tampered = signed[:-1] + ('x' if signed[-1] != 'x' else 'y')
+        with self.assertRaises(signing.BadSignature):
+            signing.loads('private', tampered)
+
+    def test_malformed_value(self):
+        for garbage in ['', 'garbage', 'no.timestamp.here', 'a.1', '\xe1\x85\xa0.1.\xe1\x85\xa0']:
+            with self.assertRaises(signing.BadSignature):
+                signing.loads('private', garbage)
+
+    def test_max_age(self):
+        signed = signing.dumps('private', 'some-access-token')
+        self.assertEqual(
+            signing.loads('private', signed, max_age=60), 'some-access-token')
+
+    def test_expired(self):
+        payload = 'some-access-token.%d' % (int(time.time()) - 120)
+        signed = '%s.%s' % (payload, signing._signature('private', payload))
+        with self.assertRaises(signing.SignatureExpired):
+            signing.loads('private', signed, max_age=60)